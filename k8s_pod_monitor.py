@@ -6,28 +6,38 @@ This operator watches for pod creation, updates, and deletion events
 and sends notifications to Slack.
 
 Requirements:
-- kubernetes Python client
-- requests for Slack API calls
+- kubernetes_asyncio Python client
+- aiohttp for Slack API calls
+- orjson for JSON encoding
 - asyncio for async operations
+- uvloop (optional) for a faster event loop
 
 Environment Variables:
 - SLACK_WEBHOOK_URL: Slack webhook URL for sending messages
-- NAMESPACE: Kubernetes namespace to watch (default: default)
+- NAMESPACE: Kubernetes namespace to watch (default: default, empty for
+  all namespaces except kube-system)
 """
 
 import os
 import asyncio
 import logging
-import json
-import threading
+import random
+import signal
+import socket
 import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, Any, Optional
-from http.server import HTTPServer, BaseHTTPRequestHandler
 
-import requests
-from kubernetes import client, config, watch
-from kubernetes.client.rest import ApiException
+import aiohttp
+import orjson
+from kubernetes_asyncio import client, config
+from kubernetes_asyncio.client.rest import ApiException
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(
@@ -36,27 +46,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Log records never include thread or process details, skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
 
-class HealthHandler(BaseHTTPRequestHandler):
-    """HTTP handler for health checks"""
-    
-    def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = {
-                'status': 'healthy',
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            self.wfile.write(json.dumps(response).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
-    
-    def log_message(self, format, *args):
-        # Suppress default HTTP logging
-        pass
+# Slack message format per pod event type
+EVENT_MESSAGES = {
+    'ADDED': "Hello world from {name}",
+    'MODIFIED': "Things have changed, {name}",
+    'DELETED': "Goodbye world from, {name}"
+}
+
+# Static Slack payload fields
+SLACK_PAYLOAD_TEMPLATE = {
+    "username": "k8s-pod-monitor",
+    "icon_emoji": ":robot_face:"
+}
+
+# Slack batching: messages queued within this window are sent as one post
+BATCH_WINDOW_SECONDS = 0.25
+BATCH_MAX_MESSAGES = 50
+SLACK_QUEUE_SIZE = 10_000
+
+# Slack post retries on throttling / server errors
+SLACK_RETRY_ATTEMPTS = 3
+SLACK_RETRY_BACKOFF = 0.2
+SLACK_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# System pods that never generate notifications
+IGNORED_NAMESPACES = frozenset({'kube-system'})
+IGNORED_LABEL_PREFIXES = ('k8s-app',)
+IGNORED_LABEL_SELECTOR = '!k8s-app'
+IGNORED_FIELD_SELECTOR = 'metadata.namespace!=kube-system'
+
+# Watch reconnect backoff, doubled per consecutive failure with jitter
+RETRY_BACKOFF_INITIAL = 1.0
+RETRY_BACKOFF_MAX = 60.0
+
+# API errors that retrying cannot fix
+FATAL_API_STATUSES = frozenset({401, 403})
+
+# Number of pods whose last notified state is remembered for MODIFIED dedup
+NOTIFY_CACHE_SIZE = 8192
+
+# Health responses, written as-is to every probe
+_HEALTH_HEADERS = (
+    b'HTTP/1.1 200 OK\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Connection: close\r\n'
+    b'Content-Length: '
+)
+_NOT_FOUND_RESPONSE = (
+    b'HTTP/1.1 404 Not Found\r\n'
+    b'Connection: close\r\n'
+    b'Content-Length: 0\r\n\r\n'
+)
+
+# Health response and the time it was rendered, refreshed once a second
+_health_cache = [0.0, b'']
+
+
+def _health_response() -> bytes:
+    """Return the cached health check HTTP response"""
+    now = time.time()
+    if now - _health_cache[0] >= 1.0:
+        body = orjson.dumps({
+            'status': 'healthy',
+            'timestamp': datetime.utcfromtimestamp(now).isoformat()
+        })
+        response = _HEALTH_HEADERS + str(len(body)).encode() + b'\r\n\r\n' + body
+        _health_cache[:] = [now, response]
+    return _health_cache[1]
+
+
+def _is_newer(rv: str, last: str) -> bool:
+    """Check whether resourceVersion rv is more recent than last"""
+    # Pods are stored in etcd, whose revisions are increasing integers
+    try:
+        return int(rv) > int(last)
+    except ValueError:
+        return rv != last
+
+
+async def _raise_for_status(resp: aiohttp.ClientResponse):
+    """Raise ApiException with the apiserver's Status body for non-200 responses"""
+    if resp.status != 200:
+        error = ApiException(status=resp.status, reason=resp.reason)
+        error.body = await resp.text()
+        raise error
 
 
 class HealthServer:
@@ -65,24 +142,40 @@ class HealthServer:
     def __init__(self, port=8080):
         self.port = port
         self.server = None
-        self.thread = None
         
-    def start(self):
-        """Start the health server in a separate thread"""
-        self.server = HTTPServer(('', self.port), HealthHandler)
-        self.thread = threading.Thread(target=self.server.serve_forever)
-        self.thread.daemon = True
-        self.thread.start()
-        logger.info(f"Health server started on port {self.port}")
+    async def start(self):
+        """Start the health server on the running event loop"""
+        self.server = await asyncio.start_server(
+            self._handle,
+            port=self.port,
+            reuse_address=True,
+            # Let several processes share the port if the operator is scaled out
+            reuse_port=hasattr(socket, 'SO_REUSEPORT')
+        )
+        logger.info("Health server started on port %s", self.port)
         
-    def stop(self):
+    async def stop(self):
         """Stop the health server"""
         if self.server:
-            self.server.shutdown()
-            self.server.server_close()
-        if self.thread:
-            self.thread.join()
+            self.server.close()
+            await self.server.wait_closed()
         logger.info("Health server stopped")
+        
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer a single probe with a preformatted response"""
+        try:
+            # Read the full request head so closing doesn't reset the socket
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+            if request.startswith((b'GET /health ', b'GET /health?')):
+                writer.write(_health_response())
+            else:
+                writer.write(_NOT_FOUND_RESPONSE)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
 
 
 class SlackNotifier:
@@ -90,32 +183,107 @@ class SlackNotifier:
     
     def __init__(self, webhook_url: str):
         self.webhook_url = webhook_url
+        self.session = None
+        
+        # Static payload fields, only 'text' changes per message
+        self._payload = dict(SLACK_PAYLOAD_TEMPLATE)
+        
+        # Messages are queued and posted in batches by a background task
+        # so the watch loop never blocks on the network
+        self._q = asyncio.Queue(maxsize=SLACK_QUEUE_SIZE)
+        self._task = None
+        
+    async def start(self):
+        """Open the Slack session and start the background sender"""
+        # Reuse keep-alive connections to Slack across messages
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=75, ttl_dns_cache=300),
+            headers={'Content-Type': 'application/json'},
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+        self._task = asyncio.create_task(self._drain_loop())
         
     def send_message(self, message: str) -> bool:
-        """Send message to Slack"""
+        """Queue message for delivery to Slack"""
         try:
-            payload = {
-                "text": message,
-                "username": "k8s-pod-monitor",
-                "icon_emoji": ":robot_face:"
-            }
+            self._q.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            logger.error("Slack queue is full, dropping message: %s", message)
+            return False
             
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                timeout=10
-            )
+    async def close(self, timeout: float = 10):
+        """Flush queued messages and stop the background sender"""
+        if self._task:
+            try:
+                # The sentinel can wait behind a full queue, keep it under the deadline
+                await asyncio.wait_for(self._drain_and_stop(), timeout)
+            except asyncio.TimeoutError:
+                logger.error("Timed out flushing Slack messages")
+                self._task.cancel()
+        if self.session:
+            await self.session.close()
             
-            if response.status_code == 200:
-                logger.info(f"Slack message sent successfully: {message}")
+    async def _drain_and_stop(self):
+        """Queue the stop sentinel and wait for the sender to finish"""
+        await self._q.put(None)
+        await self._task
+        
+    async def _drain_loop(self):
+        """Coalesce queued messages into a single Slack post per window"""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self._q.get()
+            if message is None:
+                return
+                
+            batch = [message]
+            stop = False
+            deadline = loop.time() + BATCH_WINDOW_SECONDS
+            while len(batch) < BATCH_MAX_MESSAGES:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(self._q.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if message is None:
+                    stop = True
+                    break
+                batch.append(message)
+                
+            await self._post("\n".join(batch))
+            if stop:
+                return
+                
+    async def _post(self, message: str) -> bool:
+        """Send message to Slack, retrying throttled or failed posts"""
+        payload = self._payload
+        payload["text"] = message
+        data = orjson.dumps(payload)
+        
+        for attempt in range(SLACK_RETRY_ATTEMPTS + 1):
+            if attempt:
+                await asyncio.sleep(SLACK_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                async with self.session.post(self.webhook_url, data=data) as response:
+                    # Read the body so the connection goes back to the pool
+                    await response.read()
+                    status = response.status
+            except Exception as e:
+                logger.error("Error sending Slack message: %s", e)
+                continue
+                
+            if status == 200:
+                logger.info("Slack message sent successfully: %s", message)
                 return True
-            else:
-                logger.error(f"Failed to send Slack message. Status: {response.status_code}")
+                
+            logger.error("Failed to send Slack message. Status: %s", status)
+            if status not in SLACK_RETRY_STATUSES:
                 return False
                 
-        except Exception as e:
-            logger.error(f"Error sending Slack message: {e}")
-            return False
+        return False
 
 
 class PodMonitorOperator:
@@ -127,6 +295,23 @@ class PodMonitorOperator:
         self.v1 = None
         self.health_server = None
         self.running = False
+        self._stop_event = asyncio.Event()
+        self._backoff = RETRY_BACKOFF_INITIAL
+        
+        # In-flight watch response, closed by stop() to abort the stream
+        self._resp = None
+        
+        # Last resourceVersion seen, so reconnects resume instead of re-listing
+        self._rv = None
+        
+        # Local index of watched pods, UID -> (last resourceVersion handled, name)
+        self._index = {}
+        
+        # Set when the watch expired and the index must be reconciled by a list
+        self._needs_relist = False
+        
+        # Last notified (phase, generation) hash per pod UID, bounded LRU
+        self._last_state = OrderedDict()
         
         # Initialize health server
         self.health_server = HealthServer()
@@ -138,11 +323,8 @@ class PodMonitorOperator:
             
         self.slack_notifier = SlackNotifier(webhook_url)
         
-        # Initialize Kubernetes client
-        self._init_kubernetes_client()
-        
-    def _init_kubernetes_client(self):
-        """Initialize Kubernetes client"""
+    async def _init_kubernetes_client(self):
+        """Load Kubernetes client configuration"""
         try:
             # Try to load in-cluster config first
             config.load_incluster_config()
@@ -150,13 +332,11 @@ class PodMonitorOperator:
         except Exception:
             try:
                 # Fall back to local kubeconfig
-                config.load_kube_config()
+                await config.load_kube_config()
                 logger.info("Loaded local Kubernetes config")
             except Exception as e:
-                logger.error(f"Failed to load Kubernetes config: {e}")
+                logger.error("Failed to load Kubernetes config: %s", e)
                 raise
-                
-        self.v1 = client.CoreV1Api()
         
     def _extract_pod_name(self, pod: Dict[str, Any]) -> str:
         """Extract pod name from pod object"""
@@ -164,102 +344,296 @@ class PodMonitorOperator:
         
     def _handle_pod_event(self, event_type: str, pod: Dict[str, Any]):
         """Handle different pod events"""
+        if not self._state_changed(event_type, pod):
+            return
+            
         pod_name = self._extract_pod_name(pod)
         
-        if event_type == 'ADDED':
-            message = f"Hello world from {pod_name}"
-            self.slack_notifier.send_message(message)
+        template = EVENT_MESSAGES.get(event_type)
+        if template:
+            self.slack_notifier.send_message(template.format(name=pod_name))
             
-        elif event_type == 'MODIFIED':
-            message = f"Things have changed, {pod_name}"
-            self.slack_notifier.send_message(message)
+        logger.info("Processed %s event for pod: %s", event_type, pod_name)
+        
+    def _state_changed(self, event_type: str, pod: Dict[str, Any]) -> bool:
+        """Check whether a pod event changes anything worth notifying about"""
+        metadata = pod['metadata']
+        uid = metadata['uid']
+        if event_type == 'DELETED':
+            self._last_state.pop(uid, None)
+            return True
             
-        elif event_type == 'DELETED':
-            message = f"Goodbye world from, {pod_name}"
-            self.slack_notifier.send_message(message)
+        # Status heartbeats emit MODIFIED without touching phase or spec
+        phase = pod.get('status', {}).get('phase')
+        key = hash((phase, metadata.get('generation')))
+        if event_type == 'MODIFIED' and self._last_state.get(uid) == key:
+            return False
             
-        logger.info(f"Processed {event_type} event for pod: {pod_name}")
+        self._last_state[uid] = key
+        self._last_state.move_to_end(uid)
+        if len(self._last_state) > NOTIFY_CACHE_SIZE:
+            self._last_state.popitem(last=False)
+        return True
+        
+    def _watch_target(self):
+        """Return the list function and selectors for the pod watch"""
+        # Filter system pods on the apiserver so their events are never sent
+        if self.namespace:
+            return self.v1.list_namespaced_pod, {
+                'namespace': self.namespace,
+                'label_selector': IGNORED_LABEL_SELECTOR
+            }
+        return self.v1.list_pod_for_all_namespaces, {
+            'label_selector': IGNORED_LABEL_SELECTOR,
+            'field_selector': IGNORED_FIELD_SELECTOR
+        }
         
-    def run(self):
+    async def run(self):
         """Main run loop"""
-        logger.info(f"Starting Pod Monitor Operator for namespace: {self.namespace}")
+        logger.info("Starting Pod Monitor Operator for namespace: %s", self.namespace or '<all>')
+        
+        await self._init_kubernetes_client()
         
         # Start health server
-        self.health_server.start()
+        await self.health_server.start()
+        await self.slack_notifier.start()
         self.running = True
         
-        w = watch.Watch()
+        # Pods are terminated with SIGTERM, abort the watch right away
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._interrupt)
         
         try:
-            while self.running:
-                try:
-                    logger.info("Starting to watch pod events...")
-                    
-                    for event in w.stream(
-                        self.v1.list_namespaced_pod,
-                        namespace=self.namespace,
-                        timeout_seconds=60  # Add timeout to allow graceful shutdown
-                    ):
-                        if not self.running:
-                            break
-                            
-                        event_type = event['type']
-                        pod = event['object']
+            async with client.ApiClient() as api:
+                self.v1 = client.CoreV1Api(api)
+                
+                while self.running:
+                    try:
+                        if self._needs_relist:
+                            await self._relist()
+                        await self._watch()
+                        # Only a watch that streamed to its timeout resets the backoff
+                        self._backoff = RETRY_BACKOFF_INITIAL
                         
-                        # Skip events for pods that are not user-created
-                        # (avoid noise from system pods)
-                        if self._should_ignore_pod(pod):
+                    except ApiException as e:
+                        if e.status == 410:
+                            # resourceVersion is too old, fall back to a fresh list
+                            logger.info("Watch resourceVersion expired, re-listing pods")
+                            self._rv = None
+                            self._needs_relist = True
+                            # Back off so repeated 410s can't turn into a LIST storm
+                            if self.running:
+                                await self._wait_before_retry()
                             continue
                             
-                        self._handle_pod_event(event_type, pod.to_dict())
-                        
-                except ApiException as e:
-                    logger.error(f"Kubernetes API error: {e}")
-                    # Wait before retrying
-                    if self.running:
-                        time.sleep(5)
-                    
-                except Exception as e:
-                    logger.error(f"Unexpected error: {e}")
-                    # Wait before retrying
-                    if self.running:
-                        time.sleep(5)
+                        if e.status in FATAL_API_STATUSES:
+                            logger.error("Kubernetes API denied access: %s", e)
+                            raise
+                            
+                        logger.error("Kubernetes API error: %s", e)
+                        # Wait before retrying
+                        if self.running:
+                            await self._wait_before_retry()
+                            
+                    except Exception as e:
+                        logger.error("Unexpected error: %s", e)
+                        # Wait before retrying
+                        if self.running:
+                            await self._wait_before_retry()
+                            
+        finally:
+            await self.stop()
+            
+    async def _wait_before_retry(self):
+        """Sleep with capped exponential backoff and jitter, waking on stop"""
+        delay = self._backoff * (0.5 + random.random())
+        self._backoff = min(RETRY_BACKOFF_MAX, self._backoff * 2)
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+            
+    async def _watch(self):
+        """Stream pod events until the watch times out"""
+        logger.info("Starting to watch pod events...")
+        
+        list_func, kwargs = self._watch_target()
+        if self._rv:
+            kwargs['resource_version'] = self._rv
+            
+        # Read the raw JSON lines instead of building full V1Pod models
+        resp = await list_func(
+            watch=True,
+            _preload_content=False,
+            timeout_seconds=60,  # Add timeout to allow graceful shutdown
+            allow_watch_bookmarks=True,
+            **kwargs
+        )
+        self._resp = resp
+        if not self.running:
+            # stop() ran while the request was being sent and had nothing to close
+            resp.close()
+            self._resp = None
+            return
+            
+        try:
+            async with resp:
+                await _raise_for_status(resp)
+                
+                # Only split once a chunk completes a line, so large pods
+                # arriving in many small chunks are not re-scanned each time
+                pending = bytearray()
+                async for chunk in resp.content.iter_any():
+                    pending += chunk
+                    if b'\n' not in chunk:
+                        continue
                         
+                    lines = pending.split(b'\n')
+                    del pending[:len(pending) - len(lines.pop())]
+                    for line in lines:
+                        if not self.running:
+                            return
+                        if line:
+                            self._process_event(orjson.loads(line))
+                            
+        except aiohttp.ClientError:
+            # Closing the response from stop() surfaces as a connection error
+            if self.running:
+                raise
         finally:
-            self.stop()
+            self._resp = None
+                        
+    async def _relist(self):
+        """List pods once and reconcile the local index with the result"""
+        list_func, kwargs = self._watch_target()
+        resp = await list_func(_preload_content=False, **kwargs)
+        async with resp:
+            await _raise_for_status(resp)
+            pod_list = orjson.loads(await resp.read())
+            
+        seen = set()
+        for pod in pod_list['items']:
+            metadata = pod['metadata']
+            uid = metadata['uid']
+            if self._should_ignore_pod(pod):
+                self._forget_pod(uid)
+                continue
+                
+            seen.add(uid)
+            
+            # Pods we already know about only notify if their phase or spec
+            # changed during the gap, new ones are announced as ADDED
+            event_type = 'MODIFIED' if uid in self._index else 'ADDED'
+            self._index[uid] = (metadata['resourceVersion'], metadata.get('name'))
+            self._handle_pod_event(event_type, pod)
+            
+        # Pods deleted while the watch was down never sent a DELETED event
+        for uid in [uid for uid in self._index if uid not in seen]:
+            _, name = self._index.pop(uid)
+            self._handle_pod_event('DELETED', {'metadata': {'uid': uid, 'name': name}})
+            
+        # Resume the watch from the point the list was taken
+        self._rv = pod_list['metadata']['resourceVersion']
+        self._needs_relist = False
+        
+    def _process_event(self, event: Dict[str, Any]):
+        """Dispatch a single decoded watch event"""
+        event_type = event['type']
+        pod = event['object']
+        if event_type == 'ERROR':
+            raise ApiException(status=pod.get('code'), reason=pod.get('message'))
             
-    def stop(self):
+        metadata = pod['metadata']
+        self._rv = metadata['resourceVersion']
+        
+        # Bookmarks only carry a fresh resourceVersion
+        if event_type == 'BOOKMARK':
+            return
+            
+        # Skip events for pods that are not user-created
+        # (the selectors already drop most system pods
+        # server-side, this catches label prefix variants). A pod that
+        # became ignored is dropped quietly, it was not deleted
+        if self._should_ignore_pod(pod):
+            self._forget_pod(metadata['uid'])
+            return
+            
+        # Drop events already reflected in the local index
+        if not self._update_index(event_type, pod):
+            return
+            
+        self._handle_pod_event(event_type, pod)
+        
+    def _forget_pod(self, uid: str):
+        """Drop a pod from the local index and dedup state without notifying"""
+        self._index.pop(uid, None)
+        self._last_state.pop(uid, None)
+        
+    def _update_index(self, event_type: str, pod: Dict[str, Any]) -> bool:
+        """Apply event to the local pod index, return False if nothing changed"""
+        metadata = pod['metadata']
+        uid = metadata['uid']
+        rv = metadata['resourceVersion']
+        
+        if event_type == 'DELETED':
+            self._index.pop(uid, None)
+            return True
+            
+        # A resumed watch can redeliver versions we already handled
+        last = self._index.get(uid)
+        if last is not None and not _is_newer(rv, last[0]):
+            return False
+            
+        self._index[uid] = (rv, metadata.get('name'))
+        return True
+        
+    def _interrupt(self):
+        """Wake the run loop and abort any in-flight watch request"""
+        self.running = False
+        self._stop_event.set()
+        if self._resp is not None:
+            self._resp.close()
+            
+    async def stop(self):
         """Stop the operator gracefully"""
         logger.info("Stopping Pod Monitor Operator...")
-        self.running = False
+        self._interrupt()
+        if self.slack_notifier:
+            await self.slack_notifier.close()
         if self.health_server:
-            self.health_server.stop()
+            await self.health_server.stop()
                 
-    def _should_ignore_pod(self, pod) -> bool:
+    def _should_ignore_pod(self, pod: Dict[str, Any]) -> bool:
         """Check if pod should be ignored (system pods, etc.)"""
+        metadata = pod['metadata']
+        
         # Skip pods in kube-system namespace
-        if pod.metadata.namespace == 'kube-system':
+        if metadata.get('namespace') in IGNORED_NAMESPACES:
             return True
             
         # Skip pods with system labels
-        labels = pod.metadata.labels or {}
-        if any(label.startswith('k8s-app') for label in labels.keys()):
-            return True
-            
+        labels = metadata.get('labels')
+        if labels:
+            for label in labels:
+                if label.startswith(IGNORED_LABEL_PREFIXES):
+                    return True
+                    
         return False
 
 
 def main():
     """Main entry point"""
+    if uvloop is not None:
+        uvloop.install()
+        
     try:
         namespace = os.getenv('NAMESPACE', 'default')
         operator = PodMonitorOperator(namespace)
-        operator.run()
+        asyncio.run(operator.run())
         
     except KeyboardInterrupt:
         logger.info("Received interrupt signal, shutting down...")
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         raise
 
 
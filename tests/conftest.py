@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The operator is a single top-level script, make it importable from tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
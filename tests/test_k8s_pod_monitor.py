@@ -0,0 +1,252 @@
+"""Behaviour checks for the pod watch, relist and backoff logic"""
+
+import asyncio
+
+import orjson
+import pytest
+
+import k8s_pod_monitor
+from k8s_pod_monitor import ApiException, PodMonitorOperator
+
+
+def make_pod(uid, rv, name=None, phase='Running', generation=1, labels=None):
+    return {
+        'metadata': {
+            'uid': uid,
+            'name': name or uid,
+            'namespace': 'default',
+            'resourceVersion': rv,
+            'generation': generation,
+            'labels': labels or {}
+        },
+        'status': {'phase': phase}
+    }
+
+
+def make_event(event_type, pod):
+    return orjson.dumps({'type': event_type, 'object': pod}) + b'\n'
+
+
+class FakeContent:
+    """Stand-in for aiohttp's StreamReader, yielding fixed chunks"""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+        
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    """Stand-in for the aiohttp response returned with _preload_content=False"""
+    
+    def __init__(self, body=b'', chunks=None, status=200):
+        self.body = body
+        self.status = status
+        self.reason = 'OK' if status == 200 else 'Error'
+        self.content = FakeContent(chunks if chunks is not None else [body])
+        self.closed = False
+        
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, *exc):
+        self.closed = True
+        
+    async def read(self):
+        return self.body
+        
+    async def text(self):
+        return self.body.decode()
+        
+    def close(self):
+        self.closed = True
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.messages = []
+        
+    def send_message(self, message):
+        self.messages.append(message)
+        return True
+        
+    async def start(self):
+        pass
+        
+    async def close(self):
+        pass
+
+
+class FakeHealthServer:
+    async def start(self):
+        pass
+        
+    async def stop(self):
+        pass
+
+
+class FakeApi:
+    """Serves queued watch and list responses to the operator"""
+    
+    def __init__(self):
+        self.watches = []
+        self.lists = []
+        self.calls = []
+        
+    async def list_pods(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs.get('watch'):
+            return self.watches.pop(0)
+        return self.lists.pop(0)
+
+
+@pytest.fixture
+def api():
+    return FakeApi()
+
+
+@pytest.fixture
+def operator(monkeypatch, api):
+    monkeypatch.setenv('SLACK_WEBHOOK_URL', 'https://hooks.slack.invalid/test')
+    op = PodMonitorOperator('default')
+    op.slack_notifier = FakeNotifier()
+    op.health_server = FakeHealthServer()
+    op._watch_target = lambda: (api.list_pods, {'namespace': 'default'})
+    op.running = True
+    return op
+
+
+def watch_response(*events, chunk_size=None):
+    body = b''.join(events)
+    if chunk_size is None:
+        return FakeResponse(body)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return FakeResponse(body, chunks=chunks)
+
+
+def list_response(rv, *pods):
+    return FakeResponse(orjson.dumps({'metadata': {'resourceVersion': rv}, 'items': list(pods)}))
+
+
+def test_events_split_across_chunks(operator, api):
+    big = make_pod('b', '2', labels={'k%d' % i: 'v' * 50 for i in range(100)})
+    api.watches.append(watch_response(
+        make_event('ADDED', make_pod('a', '1')),
+        make_event('ADDED', big),
+        b'{"type":"BOOKMARK","object":{"metadata":{"resourceVersion":"9"}}}\n',
+        chunk_size=7
+    ))
+    
+    asyncio.run(operator._watch())
+    
+    assert operator.slack_notifier.messages == ['Hello world from a', 'Hello world from b']
+    assert operator._rv == '9'
+
+
+def test_error_410_event_raises(operator, api):
+    status = {'kind': 'Status', 'code': 410, 'message': 'too old resource version'}
+    api.watches.append(watch_response(make_event('ERROR', status)))
+    
+    with pytest.raises(ApiException) as excinfo:
+        asyncio.run(operator._watch())
+    assert excinfo.value.status == 410
+
+
+def test_non_200_keeps_status_body(operator, api):
+    api.watches.append(FakeResponse(b'{"message":"pods is forbidden"}', status=403))
+    
+    with pytest.raises(ApiException) as excinfo:
+        asyncio.run(operator._watch())
+    assert excinfo.value.status == 403
+    assert 'pods is forbidden' in excinfo.value.body
+
+
+def test_stale_resource_version_is_dropped(operator, api):
+    api.watches.append(watch_response(
+        make_event('ADDED', make_pod('a', '5', phase='Pending')),
+        make_event('MODIFIED', make_pod('a', '7')),
+        make_event('MODIFIED', make_pod('a', '6', phase='Failed'))
+    ))
+    
+    asyncio.run(operator._watch())
+    
+    assert operator.slack_notifier.messages == ['Hello world from a', 'Things have changed, a']
+
+
+def test_relist_reconciles_index(operator, api):
+    api.watches.append(watch_response(
+        make_event('ADDED', make_pod('a', '1', phase='Pending')),
+        make_event('ADDED', make_pod('b', '2')),
+        make_event('ADDED', make_pod('c', '3'))
+    ))
+    asyncio.run(operator._watch())
+    operator.slack_notifier.messages.clear()
+    
+    # a changed phase, b was deleted, c is unchanged and d is new
+    api.lists.append(list_response(
+        '50',
+        make_pod('a', '40'),
+        make_pod('c', '3'),
+        make_pod('d', '45')
+    ))
+    asyncio.run(operator._relist())
+    
+    assert operator.slack_notifier.messages == [
+        'Things have changed, a',
+        'Hello world from d',
+        'Goodbye world from, b'
+    ]
+    assert set(operator._index) == {'a', 'c', 'd'}
+    assert operator._rv == '50'
+    assert 'watch' not in api.calls[-1]
+
+
+def test_relabelled_pod_is_forgotten(operator, api):
+    api.watches.append(watch_response(
+        make_event('ADDED', make_pod('web', '1')),
+        make_event('MODIFIED', make_pod('web', '2', labels={'k8s-app-extra': 'x'})),
+        make_event('ADDED', make_pod('api', '3')),
+        # Selector exit for the exact key arrives as DELETED carrying the label
+        make_event('DELETED', make_pod('api', '4', labels={'k8s-app': 'api'}))
+    ))
+    asyncio.run(operator._watch())
+    
+    assert operator.slack_notifier.messages == ['Hello world from web', 'Hello world from api']
+    assert operator._index == {}
+    
+    api.lists.append(list_response('10', make_pod('web', '5', labels={'k8s-app-extra': 'x'})))
+    asyncio.run(operator._relist())
+    
+    assert operator.slack_notifier.messages == ['Hello world from web', 'Hello world from api']
+
+
+def test_repeated_410_backs_off(monkeypatch, operator, api):
+    monkeypatch.setattr(k8s_pod_monitor.random, 'random', lambda: 0.5)
+    operator._backoff = 0.01
+    
+    async def no_config():
+        pass
+    operator._init_kubernetes_client = no_config
+    
+    status = {'kind': 'Status', 'code': 410, 'message': 'too old resource version'}
+    for _ in range(5):
+        api.watches.append(watch_response(make_event('ERROR', status)))
+        api.lists.append(list_response('1'))
+        
+    waits = []
+    wait_before_retry = operator._wait_before_retry
+    
+    async def recording_wait():
+        waits.append(operator._backoff)
+        await wait_before_retry()
+        if len(waits) == 5:
+            operator._interrupt()
+    operator._wait_before_retry = recording_wait
+    
+    asyncio.run(operator.run())
+    
+    relists = [call for call in api.calls if not call.get('watch')]
+    assert waits == [0.01, 0.02, 0.04, 0.08, 0.16]
+    assert len(relists) == 4